@@ -0,0 +1,44 @@
+# app_common.py
+
+"""
+Pieces shared by the dashboard apps: the Brazil timezone, the pooled HTTP
+session and the clock-hour cache key.
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BR_TZ = ZoneInfo("America/Sao_Paulo")
+
+
+@st.cache_resource(show_spinner=False)
+def get_session() -> requests.Session:
+    """
+    Keep-alive pool with retry on transient errors, for every outgoing request.
+    Held in cache_resource: the app script re-executes on every rerun, so a
+    module-level Session there would be rebuilt, and its pool emptied, each
+    time. This way there is one per process, shared by all sessions.
+    """
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+    ))
+    session.headers["Accept"] = "application/json"
+    return session
+
+
+def hour_bucket(now=None) -> str:
+    """
+    Current clock hour in Brazil, passed as an argument to the hourly
+    st.cache_data getters so they refresh on the hour. Their ttl=3600 drops
+    the previous hours' entries; they stay in memory because persist="disk"
+    ignores ttl and would keep one file per hour forever.
+    """
+    return (now or datetime.now(BR_TZ)).strftime("%Y-%m-%dT%H")
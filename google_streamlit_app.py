@@ -1,11 +1,13 @@
 import streamlit as st
 import pandas as pd
-import requests
-from datetime import datetime, timedelta
-import pytz
+import numpy as np
+import orjson
 import plotly.graph_objects as go
+import plotly.io as pio
 import os
 import math
+from concurrent.futures import ThreadPoolExecutor
+from app_common import BR_TZ, get_session, hour_bucket
 
 # ------------------------------------------------------------------
 # Branding import (DO NOT MODIFY company_branding.py)
@@ -32,30 +34,49 @@ def is_valid_image(path: str) -> bool:
         return True
     return os.path.exists(path)
 
+# Resolved once per process: the script re-executes on every rerun (an
+# lru_cache would start empty each time), so stat() + read live in cache_resource
+@st.cache_resource(show_spinner=False)
+def load_logo(path):
+    """URL as-is, local file as bytes, or None when the logo is unusable."""
+    if not is_valid_image(path):
+        return None
+    path = path.strip()
+    if path.startswith("http"):
+        return path
+    with open(path, "rb") as f:
+        return f.read()
+
 def safe_request(url, params):
     try:
-        r = requests.get(url, params=params, timeout=15)
+        r = SESSION.get(url, params=params, timeout=15)
         r.raise_for_status()
-        return r.json()
+        return orjson.loads(r.content)
     except Exception as e:
         return {"error": True, "reason": str(e)}
 
 # ------------------------------------------------------------------
 # CONFIG
 # ------------------------------------------------------------------
-BR_TZ = pytz.timezone("America/Sao_Paulo")
 st.set_page_config(page_title="Brazil Rain Dashboard", layout="wide")
+pio.json.config.default_engine = "orjson"  # faster figure JSON for st.plotly_chart
 
 GOOGLE_API_KEY = st.secrets.get("GOOGLE_WEATHER_API_KEY", "")
 
+# ------------------------------------------------------------------
+# HTTP SESSION (shared keep-alive pool, see app_common)
+# ------------------------------------------------------------------
+SESSION = get_session()
+
 # ------------------------------------------------------------------
 # Header (logos left / right)
 # ------------------------------------------------------------------
 l, c, r = st.columns([1, 2, 1])
 
 with l:
-    if is_valid_image(PRIMARY_LOGO):
-        st.image(PRIMARY_LOGO, width=160)
+    primary_logo = load_logo(PRIMARY_LOGO)
+    if primary_logo is not None:
+        st.image(primary_logo, width=160)
     else:
         st.write("")
 
@@ -72,8 +93,9 @@ with c:
     )
 
 with r:
-    if is_valid_image(SECONDARY_LOGO):
-        st.image(SECONDARY_LOGO, width=140)
+    secondary_logo = load_logo(SECONDARY_LOGO)
+    if secondary_logo is not None:
+        st.image(secondary_logo, width=140)
     else:
         st.write("")
 
@@ -96,23 +118,24 @@ CITIES = {
     "São Paulo": (-23.5505, -46.6333),
     "Vassouras": (-22.4039, -43.6628),
 }
+CITY_NAMES = tuple(CITIES)
 
 # ------------------------------------------------------------------
 # Radius sampling (5 km)
 # ------------------------------------------------------------------
-def generate_radius_points(lat, lon, radius_km=5, step_km=2.5):
-    points = []
+RADIUS_KM = 5
+
+def generate_radius_points(lat, lon, radius_km=RADIUS_KM, step_km=2.5):
+    """(n, 2) array of (lat, lon) grid points covering the radius."""
     lat_km = 1 / 111
     lon_km = 1 / (111 * math.cos(math.radians(lat)))
     steps = int(radius_km / step_km)
 
-    for i in range(-steps, steps + 1):
-        for j in range(-steps, steps + 1):
-            points.append((
-                lat + i * step_km * lat_km,
-                lon + j * step_km * lon_km
-            ))
-    return points
+    offsets = np.arange(-steps, steps + 1)
+    ii, jj = np.meshgrid(offsets, offsets, indexing="ij")
+    lats = lat + ii.ravel() * step_km * lat_km
+    lons = lon + jj.ravel() * step_km * lon_km
+    return np.stack([lats, lons], axis=1)
 
 # ------------------------------------------------------------------
 # Google Weather API – single point
@@ -132,34 +155,44 @@ def fetch_google_hourly_precip(lat, lon):
     if data.get("error") or "forecastHours" not in data:
         return pd.DataFrame(columns=["time", "precip"]), data
 
-    rows = []
-    for h in data["forecastHours"]:
-        rows.append({
-            "time": pd.to_datetime(h["forecastTime"]),
-            "precip": h.get("precipitation", {}).get("amount", {}).get("value", 0.0)
-        })
-
-    df = pd.DataFrame(rows)
+    hours = data["forecastHours"]
+    times = [h["forecastTime"] for h in hours]
+    precips = [
+        ((h.get("precipitation") or {}).get("amount") or {}).get("value", 0.0)
+        for h in hours
+    ]
+
+    df = pd.DataFrame({
+        "time": pd.to_datetime(times, format="ISO8601", utc=True, errors="coerce"),
+        "precip": np.asarray(precips, dtype=np.float32),
+    })
     df["time"] = df["time"].dt.tz_convert("America/Sao_Paulo")
     return df, data
 
 # ------------------------------------------------------------------
 # Max precipitation within 5 km radius
 # ------------------------------------------------------------------
-def fetch_max_precip_radius(lat, lon):
-    points = generate_radius_points(lat, lon, radius_km=5)
-    dfs = []
-    raw = []
+def fetch_max_precip_radius(lat, lon, radius_km=RADIUS_KM):
+    points = generate_radius_points(lat, lon, radius_km=radius_km)
+
+    # Workers share SESSION's pool, so handshakes are reused across the grid
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        results = list(ex.map(lambda p: fetch_google_hourly_precip(*p), points))
 
-    for p_lat, p_lon in points:
-        df, raw_resp = fetch_google_hourly_precip(p_lat, p_lon)
-        raw.append(raw_resp)
-        if not df.empty:
-            dfs.append(df)
+    dfs = [df for df, _ in results if not df.empty]
+    raw = [raw_resp for _, raw_resp in results]
 
     if not dfs:
         return pd.DataFrame(columns=["time", "max_precip"]), raw
 
+    times = dfs[0]["time"]
+    if all(d["time"].equals(times) for d in dfs[1:]):
+        # Same forecast hours at every point: reduce a (points, hours) matrix.
+        # fmax skips NaN like groupby().max() does.
+        precip_mat = np.vstack([d["precip"].to_numpy() for d in dfs])
+        df_max = pd.DataFrame({"time": times, "max_precip": np.fmax.reduce(precip_mat, axis=0)})
+        return df_max.sort_values("time"), raw
+
     combined = pd.concat(dfs)
     df_max = (
         combined
@@ -171,80 +204,81 @@ def fetch_max_precip_radius(lat, lon):
 
     return df_max, raw
 
-@st.cache_data(ttl=3600)
-def fetch_max_precip_radius_cached(lat, lon):
-    return fetch_max_precip_radius(lat, lon)
+@st.cache_data(ttl=3600, max_entries=64)
+def fetch_max_precip_radius_cached(lat, lon, hour_key):
+    return fetch_max_precip_radius(lat, lon, radius_km=RADIUS_KM)
 
 # ------------------------------------------------------------------
 # STREAMLIT UI
 # ------------------------------------------------------------------
 st.title("🌧️ Brazil Precipitation Dashboard (Google Weather API)")
 
-city = st.selectbox("Select a city:", list(CITIES.keys()))
-lat, lon = CITIES[city]
-
-with st.spinner("Fetching Google Weather data (cached hourly)..."):
-    df_radius, raw_responses = fetch_max_precip_radius_cached(lat, lon)
-
-# ------------------------------------------------------------------
-# Plot
-# ------------------------------------------------------------------
-if df_radius.empty:
-    st.warning("No precipitation data available.")
-else:
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=df_radius["time"],
-        y=df_radius["max_precip"],
-        mode="lines",
-        name="Max precipitation (5 km radius)",
-        line=dict(width=3)
-    ))
-
-    fig.update_layout(
-        title=f"Hourly Max Precipitation (5 km radius) — {city}",
-        xaxis_title="Date / Time (BRT)",
-        yaxis_title="Precipitation (mm)",
-        hovermode="x unified",
-        template="plotly_white",
-    )
+# City-dependent panel: a city change reruns only this fragment,
+# not the header/logos above it.
+@st.fragment
+def city_panel():
+    city = st.selectbox("Select a city:", CITY_NAMES)
+    lat, lon = CITIES[city]
 
-    st.plotly_chart(fig, use_container_width=True)
+    with st.spinner("Fetching Google Weather data (cached hourly)..."):
+        df_radius, raw_responses = fetch_max_precip_radius_cached(lat, lon, hour_bucket())
 
-# ------------------------------------------------------------------
-# Current status card
-# ------------------------------------------------------------------
-if not df_radius.empty:
-    last_row = df_radius.iloc[-1]
-    val = float(last_row["max_precip"])
-    time_str = last_row["time"].strftime("%d/%m/%Y %H:%M")
-
-    if val <= 0:
-        label = "Not raining"
-        emoji = "☀️"
-    elif val <= 2:
-        label = "Mild rain"
-        emoji = "🌦️"
+    # Plot
+    if df_radius.empty:
+        st.warning("No precipitation data available.")
     else:
-        label = "Heavy rain"
-        emoji = "⛈️"
-
-    st.markdown(
-        f"""
-        <div style="padding:12px;border-radius:10px;border:1px solid #e6e6e6;background:#ffffffcc;">
-            <strong>{emoji} Current Rain Status — {city}</strong><br/>
-            {label} · Last hour: <strong>{val:.2f} mm</strong><br/>
-            <small>{time_str} (BRT)</small>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
-
-# ------------------------------------------------------------------
-# Debug
-# ------------------------------------------------------------------
-with st.expander("🛠 Debug: Raw Google API responses"):
-    st.json(raw_responses)
-
-with st.expander("🛠 Debug: Aggregated DataFrame"):
-    st.dataframe(df_radius)
+        fig = go.Figure()
+        fig.add_trace(go.Scattergl(
+            x=df_radius["time"],
+            y=df_radius["max_precip"],
+            mode="lines",
+            name="Max precipitation (5 km radius)",
+            line=dict(width=3)
+        ))
+
+        fig.update_layout(
+            title=f"Hourly Max Precipitation (5 km radius) — {city}",
+            xaxis_title="Date / Time (BRT)",
+            yaxis_title="Precipitation (mm)",
+            hovermode="x unified",
+            template="plotly_white",
+        )
+
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Current status card
+    if not df_radius.empty:
+        val = float(df_radius["max_precip"].iat[-1])
+        time_str = df_radius["time"].iat[-1].strftime("%d/%m/%Y %H:%M")
+
+        if val <= 0:
+            label = "Not raining"
+            emoji = "☀️"
+        elif val <= 2:
+            label = "Mild rain"
+            emoji = "🌦️"
+        else:
+            label = "Heavy rain"
+            emoji = "⛈️"
+
+        st.markdown(
+            f"""
+            <div style="padding:12px;border-radius:10px;border:1px solid #e6e6e6;background:#ffffffcc;">
+                <strong>{emoji} Current Rain Status — {city}</strong><br/>
+                {label} · Last hour: <strong>{val:.2f} mm</strong><br/>
+                <small>{time_str} (BRT)</small>
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
+
+    # Debug (only with ?debug=1: collapsed expanders still ship their payload)
+    if st.query_params.get("debug") == "1":
+        with st.expander("🛠 Debug: Raw Google API responses"):
+            st.json(raw_responses)
+
+        with st.expander("🛠 Debug: Aggregated DataFrame"):
+            st.dataframe(df_radius)
+
+
+city_panel()
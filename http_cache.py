@@ -0,0 +1,89 @@
+# http_cache.py
+
+"""
+Small on-disk cache for JSON API responses (Open-Meteo).
+
+Streamlit's st.cache_data stays the in-memory first level; this sits under it
+so a restarted container or a fresh worker reads recent responses from disk
+instead of going back to the network. Each entry is a JSON file holding
+{"ts": <epoch seconds>, "payload": <response>} and is stale after `ttl`.
+Files older than `max_age` are deleted, at most once per PRUNE_INTERVAL,
+when a new entry is written.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / ".cache" / "openmeteo"
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+PRUNE_INTERVAL = 3600
+
+
+class FileCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_age: float = DEFAULT_MAX_AGE):
+        self.root = Path(root)
+        self.max_age = max_age  # should be at least the longest ttl in use
+        self._last_prune = 0.0
+
+    def _path(self, url: str, params=None) -> Path:
+        query = urlencode(sorted((params or {}).items()))
+        key = hashlib.md5(f"{url}?{query}".encode()).hexdigest()
+        return self.root / f"{key}.json"
+
+    def get(self, url: str, params=None, ttl: float = 3600):
+        """Cached payload for (url, params), or None if missing or stale."""
+        try:
+            with open(self._path(url, params), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("ts", 0) > ttl:
+            return None
+        return entry.get("payload")
+
+    def set(self, url: str, params, payload) -> None:
+        path = self._path(url, params)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"ts": time.time(), "payload": payload}, f)
+            os.replace(tmp, path)  # readers never see a half-written file
+        except OSError:
+            return  # best effort: a read-only disk must not break the dashboard
+        if time.time() - self._last_prune > PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self) -> None:
+        """Delete entries (and stray temp files) older than max_age."""
+        now = time.time()
+        self._last_prune = now
+        try:
+            paths = list(self.root.iterdir())
+        except OSError:
+            return
+        for path in paths:
+            try:
+                if now - path.stat().st_mtime > self.max_age:
+                    path.unlink()
+            except OSError:
+                pass  # already removed by another worker
+
+    def get_or_fetch(self, url: str, params, ttl: float, fetch):
+        """
+        Return the cached payload if fresh, otherwise call fetch() and store
+        its result. Error payloads ({"error": True, ...}) are never stored.
+        """
+        payload = self.get(url, params, ttl)
+        if payload is not None:
+            return payload
+
+        payload = fetch()
+        if not (isinstance(payload, dict) and payload.get("error") is True):
+            self.set(url, params, payload)
+        return payload
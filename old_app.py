@@ -1,19 +1,24 @@
 import streamlit as st
 import pandas as pd
-import requests
-import pytz
-from datetime import datetime, timedelta
+import numpy as np
+import orjson
+from datetime import date, datetime, timedelta, timezone
 import plotly.graph_objects as go
+import plotly.io as pio
 import plotly.express as px
+from shapely.geometry import mapping, shape
+from app_common import BR_TZ, get_session, hour_bucket
 
 # =========================================================
 # BASIC CONFIG
 # =========================================================
-BR_TZ = pytz.timezone("America/Sao_Paulo")
+pio.json.config.default_engine = "orjson"  # faster figure JSON for st.plotly_chart
 
 st.set_page_config(page_title="Brazil Precipitation Dashboard", layout="wide")
 st.title("🌧️ Brazil Precipitation Dashboard")
 
+SESSION = get_session()  # shared keep-alive pool, see app_common
+
 # =========================================================
 # CITY LIST (12 CITIES, ALPHABETICAL)
 # =========================================================
@@ -31,7 +36,7 @@ CITIES = {
     "São Paulo": (-23.5505, -46.6333),
     "Vassouras": (-22.4039, -43.6628),
 }
-CITY_NAMES = sorted(CITIES.keys())
+CITY_NAMES = tuple(sorted(CITIES))
 
 # =========================================================
 # BRAZIL STATE CAPITALS (FOR HEATMAP)
@@ -65,6 +70,8 @@ BRAZIL_STATES_CAPITALS = {
     "Sergipe": (-10.9472, -37.0731),           # Aracaju
     "Tocantins": (-10.2491, -48.3243),         # Palmas
 }
+STATE_NAMES = tuple(BRAZIL_STATES_CAPITALS)
+STATE_COORDS = np.array(list(BRAZIL_STATES_CAPITALS.values()))  # (n, 2) lat, lon
 
 BRAZIL_GEOJSON_URL = (
     "https://raw.githubusercontent.com/codeforamerica/"
@@ -74,18 +81,46 @@ BRAZIL_GEOJSON_URL = (
 # =========================================================
 # HELPERS
 # =========================================================
+# Rain thresholds (mm/hour) and labels shared by rain_emoji / rain_status
+DRY_MAX = 0
+MILD_MAX = 2
+DRY_LABEL = "☀️ Not raining"
+MILD_LABEL = "🌧️ Mild rain"
+STRONG_LABEL = "⛈️ Strong rain"
+
+
+def rain_status(values: np.ndarray) -> np.ndarray:
+    """Three-stage emoji label per precipitation value in mm/hour."""
+    return np.select(
+        [values <= DRY_MAX, values <= MILD_MAX],
+        [DRY_LABEL, MILD_LABEL],
+        default=STRONG_LABEL,
+    )
+
+
 def rain_emoji(value: float) -> str:
     """Three-stage emoji based on latest precipitation in mm/hour."""
-    if value <= 0:
-        return "☀️ Not raining"
-    elif value <= 2:
-        return "🌧️ Mild rain"
+    if value <= DRY_MAX:
+        return DRY_LABEL
+    elif value <= MILD_MAX:
+        return MILD_LABEL
     else:
-        return "⛈️ Strong rain"
+        return STRONG_LABEL
+
+
+def hourly_frame(hourly: dict) -> pd.DataFrame:
+    """
+    Build the hourly frame straight from Open-Meteo's column arrays: typed
+    arrays go in as-is, with no object-dtype intermediate to convert.
+    """
+    return pd.DataFrame({
+        "time": pd.to_datetime(hourly["time"], format="%Y-%m-%dT%H:%M"),
+        "precipitation": np.asarray(hourly["precipitation"], dtype=np.float32),
+    })
 
 
-@st.cache_data(show_spinner=False)
-def get_hourly_precip(lat: float, lon: float) -> pd.DataFrame:
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=64)
+def get_hourly_precip(lat: float, lon: float, hour_key: str) -> pd.DataFrame:
     """7 past days + 2 future days hourly precipitation."""
     url = (
         "https://api.open-meteo.com/v1/forecast"
@@ -93,21 +128,50 @@ def get_hourly_precip(lat: float, lon: float) -> pd.DataFrame:
         "&hourly=precipitation&past_days=7&forecast_days=2"
         "&timezone=America%2FSao_Paulo"
     )
-    data = requests.get(url).json()
-    df = pd.DataFrame(data["hourly"])
-    df["time"] = pd.to_datetime(df["time"])
-    return df
+    data = orjson.loads(SESSION.get(url, timeout=15).content)
+    return hourly_frame(data["hourly"])
 
 
-@st.cache_data(show_spinner=False)
-def get_monthly_precip(lat: float, lon: float) -> pd.DataFrame:
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=64)
+def get_all_hourly_precip(hour_key: str) -> dict:
+    """
+    Hourly precipitation for every city in one multi-location request,
+    so switching cities in the selectbox needs no network call.
+    Cities missing from the response are left out; callers fall back
+    to get_hourly_precip for them.
+    """
+    lats = ",".join(str(lat) for lat, _ in CITIES.values())
+    lons = ",".join(str(lon) for _, lon in CITIES.values())
+    url = (
+        "https://api.open-meteo.com/v1/forecast"
+        f"?latitude={lats}&longitude={lons}"
+        "&hourly=precipitation&past_days=7&forecast_days=2"
+        "&timezone=America%2FSao_Paulo"
+    )
+    try:
+        data = orjson.loads(SESSION.get(url, timeout=15).content)
+    except Exception:
+        return {}
+    # An error comes back as a single object instead of a list
+    if not isinstance(data, list):
+        return {}
+
+    frames = {}
+    for city, block in zip(CITIES, data):
+        if "hourly" not in block:
+            continue
+        frames[city] = hourly_frame(block["hourly"])
+    return frames
+
+
+@st.cache_data(show_spinner=False, ttl=86400)
+def get_monthly_precip(lat: float, lon: float, end_date: date) -> pd.DataFrame:
     """
     Last 12 months total precipitation using the climate API.
-    Uses a 2-year window then keeps the last 12 monthly values.
+    Uses a 2-year window ending at `end_date` then keeps the last 12 monthly
+    values. The date is an argument so it is part of the cache key.
     """
-    now = datetime.utcnow()
-    end_date = now.date()
-    start_date = (now - timedelta(days=730)).date()
+    start_date = end_date - timedelta(days=730)
 
     url = (
         "https://climate-api.open-meteo.com/v1/climate?"
@@ -115,7 +179,7 @@ def get_monthly_precip(lat: float, lon: float) -> pd.DataFrame:
         f"&start_date={start_date}&end_date={end_date}"
         "&monthly=precipitation_sum"
     )
-    data = requests.get(url).json()
+    data = orjson.loads(SESSION.get(url, timeout=15).content)
     if "monthly" not in data:
         return pd.DataFrame(columns=["month", "precip"])
 
@@ -124,43 +188,93 @@ def get_monthly_precip(lat: float, lon: float) -> pd.DataFrame:
     if not months:
         return pd.DataFrame(columns=["month", "precip"])
 
-    df = pd.DataFrame({"month": pd.to_datetime(months), "precip": precip})
-    df = df.sort_values("month").tail(12)
+    # Open-Meteo dates are ISO YYYY-MM-DD; anything else becomes NaT and
+    # is dropped rather than failing the panel.
+    df = pd.DataFrame({
+        "month": pd.to_datetime(months, format="%Y-%m-%d", cache=True, errors="coerce"),
+        "precip": np.asarray(precip, dtype=np.float32),
+    })
+    df = df.dropna(subset=["month"]).sort_values("month").tail(12)
     return df
 
 
-@st.cache_data(show_spinner=False)
-def load_brazil_geojson():
-    """Load Brazil states GeoJSON used for choropleth."""
-    resp = requests.get(BRAZIL_GEOJSON_URL)
+@st.cache_data(show_spinner=False, persist="disk")
+def _geojson_bytes() -> bytes:
+    """Raw Brazil states GeoJSON payload, persisted to disk."""
+    resp = SESSION.get(BRAZIL_GEOJSON_URL, timeout=15)
     resp.raise_for_status()
-    return resp.json()
+    return resp.content
 
 
-@st.cache_data(show_spinner=False)
-def get_state_precip(days: int) -> pd.DataFrame:
+@st.cache_resource(show_spinner=False)
+def load_brazil_geojson():
     """
-    Total precipitation over the last `days` days for each Brazilian state,
-    using daily precipitation_sum.
+    Load Brazil states GeoJSON used for choropleth.
+    Held by reference: cache_data would unpickle the whole dict on each hit.
     """
-    records = []
-    for state, (lat, lon) in BRAZIL_STATES_CAPITALS.items():
-        url = (
-            "https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lon}"
-            f"&daily=precipitation_sum&past_days={days}&forecast_days=0"
-            "&timezone=America%2FSao_Paulo"
-        )
-        data = requests.get(url).json()
-        vals = data.get("daily", {}).get("precipitation_sum", [])
-        total = float(sum(vals)) if vals else 0.0
-        records.append({"state": state, "precip": total})
-    return pd.DataFrame(records)
+    return orjson.loads(_geojson_bytes())
 
 
-def build_brazil_heatmap(days: int):
-    df_states = get_state_precip(days)
-    geojson = load_brazil_geojson()
+@st.cache_resource(show_spinner=False)
+def pruned_brazil_geojson():
+    """
+    Simplified copy of the states GeoJSON for the choropleth. Plotly ships
+    the geometry to the browser on every render, so fewer vertices means
+    less JSON to encode and send. The cached original is left untouched.
+    """
+    gj = load_brazil_geojson()
+    features = [
+        {
+            **f,
+            "geometry": mapping(
+                shape(f["geometry"]).simplify(0.02, preserve_topology=True)
+            ),
+        }
+        for f in gj["features"]
+    ]
+    return {**gj, "features": features}
+
+
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=64)
+def get_state_precip(days: int, hour_key: str) -> pd.DataFrame:
+    """
+    Total precipitation over the last `days` days for each Brazilian state,
+    using daily precipitation_sum. All capitals go in one multi-location
+    request; Open-Meteo returns one block per coordinate, in order.
+    """
+    lats = ",".join(map(str, STATE_COORDS[:, 0]))
+    lons = ",".join(map(str, STATE_COORDS[:, 1]))
+    url = (
+        "https://api.open-meteo.com/v1/forecast"
+        f"?latitude={lats}&longitude={lons}"
+        f"&daily=precipitation_sum&past_days={days}&forecast_days=0"
+        "&timezone=America%2FSao_Paulo"
+    )
+    data = orjson.loads(SESSION.get(url, timeout=15).content)
+    # An error comes back as a single object instead of a list
+    if not isinstance(data, list):
+        data = [{}] * len(STATE_NAMES)
+
+    # Stage every state's series into one (states, days) matrix, NaN-padded
+    # for missing blocks, and reduce it in a single call. nansum also absorbs
+    # the nulls Open-Meteo sends for missing days; an all-NaN row sums to 0.
+    mat = np.full((len(STATE_NAMES), days), np.nan, dtype=np.float32)
+    for i, block in enumerate(data):
+        vals = (block.get("daily", {}).get("precipitation_sum") or [])[-days:]
+        if vals:
+            mat[i, -len(vals):] = np.asarray(vals, dtype=np.float32)
+    return pd.DataFrame({"state": STATE_NAMES, "precip": np.nansum(mat, axis=1)})
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def build_brazil_heatmap(days: int, hour_key: str):
+    """
+    Choropleth for the last `days` days, built once per (days, hour).
+    Held by reference like the GeoJSON: the figure embeds the whole
+    geometry, so cache_data would copy it on every hit.
+    """
+    df_states = get_state_precip(days, hour_key)
+    geojson = pruned_brazil_geojson()
     max_precip = max(df_states["precip"].max(), 1.0)
 
     fig = px.choropleth(
@@ -189,95 +303,110 @@ def build_brazil_heatmap(days: int):
 # =========================================================
 # UI – CITY SELECTION
 # =========================================================
-city = st.selectbox("Select city", CITY_NAMES)
-lat, lon = CITIES[city]
-
-with st.spinner("Loading hourly data..."):
-    df_hourly = get_hourly_precip(lat, lon)
-
-with st.spinner("Loading monthly data..."):
-    df_monthly = get_monthly_precip(lat, lon)
-
-now_br = datetime.now(BR_TZ)
-hist_mask = df_hourly["time"] <= now_br
-df_hist = df_hourly[hist_mask]
-df_forecast = df_hourly[~hist_mask]
+# A fragment reruns on its own widget changes, so picking a city does not
+# rebuild the heatmap and moving the slider does not refetch the city.
+@st.fragment
+def city_panel():
+    city = st.selectbox("Select city", CITY_NAMES)
+    lat, lon = CITIES[city]
+
+    hour_key = hour_bucket()
+    with st.spinner("Loading hourly data..."):
+        df_hourly = get_all_hourly_precip(hour_key).get(city)
+        if df_hourly is None:
+            df_hourly = get_hourly_precip(lat, lon, hour_key)
+
+    with st.spinner("Loading monthly data..."):
+        df_monthly = get_monthly_precip(lat, lon, datetime.now(timezone.utc).date())
+
+    # Times are naive local (timezone=America/Sao_Paulo in the query) and
+    # sorted, so one binary search splits history from forecast.
+    now_br = datetime.now(BR_TZ).replace(tzinfo=None)
+    split = int(np.searchsorted(df_hourly["time"].to_numpy(), np.datetime64(now_br), side="right"))
+    df_hist = df_hourly.iloc[:split]
+    df_forecast = df_hourly.iloc[split:]
+
+    if not df_hist.empty:
+        latest_precip = float(df_hist["precipitation"].iat[-1])
+    else:
+        latest_precip = float(df_hourly["precipitation"].iat[-1])
 
-if not df_hist.empty:
-    latest_precip = float(df_hist.iloc[-1]["precipitation"])
-else:
-    latest_precip = float(df_hourly.iloc[-1]["precipitation"])
+    status = rain_emoji(latest_precip)
 
-status = rain_emoji(latest_precip)
+    st.subheader(f"{city} — Current rain status: {status}")
+    st.caption(f"Last observed hourly precipitation: {latest_precip:.2f} mm (local time)")
 
-st.subheader(f"{city} — Current rain status: {status}")
-st.caption(f"Last observed hourly precipitation: {latest_precip:.2f} mm (local time)")
+    # Hourly line chart (7 days + forecast dashed)
+    fig_hourly = go.Figure()
 
-# =========================================================
-# HOURLY LINE CHART (7 DAYS + FORECAST DASHED)
-# =========================================================
-fig_hourly = go.Figure()
-
-if not df_hist.empty:
-    fig_hourly.add_trace(
-        go.Scatter(
-            x=df_hist["time"],
-            y=df_hist["precipitation"],
-            mode="lines",
-            name="History",
+    if not df_hist.empty:
+        fig_hourly.add_trace(
+            go.Scattergl(
+                x=df_hist["time"].to_numpy(),
+                y=df_hist["precipitation"].to_numpy(),
+                mode="lines",
+                name="History",
+            )
         )
-    )
 
-if not df_forecast.empty:
-    fig_hourly.add_trace(
-        go.Scatter(
-            x=df_forecast["time"],
-            y=df_forecast["precipitation"],
-            mode="lines",
-            name="Forecast",
-            line=dict(dash="dash"),
+    if not df_forecast.empty:
+        fig_hourly.add_trace(
+            go.Scattergl(
+                x=df_forecast["time"].to_numpy(),
+                y=df_forecast["precipitation"].to_numpy(),
+                mode="lines",
+                name="Forecast",
+                line=dict(dash="dash"),
+            )
         )
-    )
-
-fig_hourly.update_layout(
-    title="Hourly Precipitation – Last 7 Days (History + Forecast)",
-    xaxis_title="Time (America/Sao_Paulo)",
-    yaxis_title="mm",
-    hovermode="x unified",
-)
-st.plotly_chart(fig_hourly, use_container_width=True)
 
-# =========================================================
-# 12-MONTH BAR CHART
-# =========================================================
-st.subheader("Last 12 Months – Total Monthly Precipitation")
-
-if df_monthly.empty:
-    st.info("No monthly precipitation data available for this location.")
-else:
-    fig_month = go.Figure()
-    fig_month.add_bar(x=df_monthly["month"], y=df_monthly["precip"])
-    fig_month.update_layout(
-        xaxis_title="Month",
+    fig_hourly.update_layout(
+        title="Hourly Precipitation – Last 7 Days (History + Forecast)",
+        xaxis_title="Time (America/Sao_Paulo)",
         yaxis_title="mm",
         hovermode="x unified",
     )
-    st.plotly_chart(fig_month, use_container_width=True)
+    st.plotly_chart(fig_hourly, use_container_width=True)
+
+    # 12-month bar chart
+    st.subheader("Last 12 Months – Total Monthly Precipitation")
+
+    if df_monthly.empty:
+        st.info("No monthly precipitation data available for this location.")
+    else:
+        fig_month = go.Figure()
+        fig_month.add_bar(x=df_monthly["month"].to_numpy(), y=df_monthly["precip"].to_numpy())
+        fig_month.update_layout(
+            xaxis_title="Month",
+            yaxis_title="mm",
+            hovermode="x unified",
+        )
+        st.plotly_chart(fig_month, use_container_width=True)
+
+    # Optional debug table (only with ?debug=1 in the URL)
+    if st.query_params.get("debug") == "1":
+        with st.expander("Debug – raw hourly data"):
+            st.dataframe(df_hourly.assign(
+                status=rain_status(df_hourly["precipitation"].to_numpy())
+            ))
+
+
+city_panel()
+
 
 # =========================================================
 # BRAZIL HEATMAP (LAST N DAYS, DEFAULT 7)
 # =========================================================
-st.subheader("Brazil Precipitation Heatmap")
+@st.fragment
+def heatmap_panel():
+    st.subheader("Brazil Precipitation Heatmap")
 
-days_heatmap = st.slider("Number of days for heatmap", min_value=3, max_value=14, value=7)
+    days_heatmap = st.slider("Number of days for heatmap", min_value=3, max_value=14, value=7)
 
-with st.spinner("Building Brazil precipitation heatmap..."):
-    fig_heat = build_brazil_heatmap(days_heatmap)
+    with st.spinner("Building Brazil precipitation heatmap..."):
+        fig_heat = build_brazil_heatmap(days_heatmap, hour_bucket())
 
-st.plotly_chart(fig_heat, use_container_width=True)
+    st.plotly_chart(fig_heat, use_container_width=True)
 
-# =========================================================
-# OPTIONAL DEBUG TABLE
-# =========================================================
-with st.expander("Debug – raw hourly data"):
-    st.dataframe(df_hourly)
+
+heatmap_panel()
@@ -1,10 +1,19 @@
 import streamlit as st
 import pandas as pd
-import requests
-from datetime import datetime, timedelta
-import pytz
+import numpy as np
+import orjson
+from datetime import date, datetime, timedelta, timezone
 import plotly.graph_objects as go
+import plotly.io as pio
 import os
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from app_common import BR_TZ, get_session, hour_bucket
+from http_cache import FileCache
 
 # ------------------------------------------------------------------
 # Branding import (do not modify company_branding.py)
@@ -41,11 +50,28 @@ def is_valid_image(path: str) -> bool:
         return True
     return os.path.exists(path)
 
+# ------------------------------------------------------------------
+# Logo loading, resolved once per process. The script re-executes on
+# every rerun (a functools.lru_cache here would start empty each time),
+# so the stat() + file read are held in st.cache_resource instead.
+# ------------------------------------------------------------------
+@st.cache_resource(show_spinner=False)
+def load_logo(path):
+    """URL as-is, local file as bytes, or None when the logo is unusable."""
+    if not is_valid_image(path):
+        return None
+    path = path.strip()
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    with open(path, "rb") as f:
+        return f.read()
+
 # ------------------------------------------------------------------
 # CONFIG
 # ------------------------------------------------------------------
-BR_TZ = pytz.timezone("America/Sao_Paulo")
 st.set_page_config(page_title="Brazil Rain Dashboard", layout="wide")
+pio.json.config.default_engine = "orjson"  # faster figure JSON for st.plotly_chart
+logger = logging.getLogger(__name__)
 
 # ------------------------------------------------------------------
 # Header with logos (Option B: left and right)
@@ -53,9 +79,10 @@ st.set_page_config(page_title="Brazil Rain Dashboard", layout="wide")
 col_l, col_c, col_r = st.columns([1, 2, 1])
 
 with col_l:
-    if is_valid_image(PRIMARY_LOGO):
+    primary_logo = load_logo(PRIMARY_LOGO)
+    if primary_logo is not None:
         try:
-            st.image(PRIMARY_LOGO, width=160)
+            st.image(primary_logo, width=160)
         except Exception:
             st.write("")  # keep space, do not crash
     else:
@@ -75,9 +102,10 @@ with col_c:
     )
 
 with col_r:
-    if is_valid_image(SECONDARY_LOGO):
+    secondary_logo = load_logo(SECONDARY_LOGO)
+    if secondary_logo is not None:
         try:
-            st.image(SECONDARY_LOGO, width=140)
+            st.image(secondary_logo, width=140)
         except Exception:
             st.write("")
     else:
@@ -102,18 +130,47 @@ CITIES = {
     "São Paulo": (-23.5505, -46.6333),
     "Vassouras": (-22.4039, -43.6628),
 }
+CITY_NAMES = tuple(CITIES)
+# Column form for the multi-location batch, in CITY_NAMES order. Kept float64:
+# float32 would round the coordinates that go into the request URL.
+CITY_LATS = np.array([lat for lat, _ in CITIES.values()])
+CITY_LONS = np.array([lon for _, lon in CITIES.values()])
+
+# ------------------------------------------------------------------
+# HTTP SESSION (shared keep-alive pool, see app_common)
+# ------------------------------------------------------------------
+SESSION = get_session()
 
 # ------------------------------------------------------------------
 # SAFE REQUEST WRAPPER
 # ------------------------------------------------------------------
 def safe_request_json(url: str):
     try:
-        r = requests.get(url, timeout=15)
+        r = SESSION.get(url, timeout=15)
         r.raise_for_status()
-        return r.json()
+        return orjson.loads(r.content)
     except Exception as e:
         return {"error": True, "reason": str(e)}
 
+# Second-level cache under st.cache_data: survives restarts, so a cold start
+# does not refetch every city from the network. Held in cache_resource so its
+# pruning runs once per interval per process, not once per rerun.
+ARCHIVE_TTL = 7 * 24 * 3600   # ERA5 past days do not change
+
+@st.cache_resource(show_spinner=False)
+def get_http_cache() -> FileCache:
+    return FileCache(max_age=ARCHIVE_TTL)
+
+HTTP_CACHE = get_http_cache()
+
+def hourly_ttl() -> float:
+    """
+    Seconds since the top of the hour (BRT is a whole-hour offset from UTC),
+    so a forecast written in an earlier hour is never handed to a new hour
+    bucket, where st.cache_data would pin it for another hour.
+    """
+    return time.time() % 3600
+
 # ------------------------------------------------------------------
 # FETCH HOURLY PRECIPITATION (7 days history + forecast)
 # ------------------------------------------------------------------
@@ -132,7 +189,7 @@ def fetch_precip(lat, lon, city_name):
         "&timezone=America%2FSao_Paulo"
     )
 
-    data = safe_request_json(url)
+    data = HTTP_CACHE.get_or_fetch(url, None, hourly_ttl(), lambda: safe_request_json(url))
 
     # If API explicitly returned an error (e.g., rate limit), return empty df and raw json
     if isinstance(data, dict) and data.get("error") is True:
@@ -144,172 +201,368 @@ def fetch_precip(lat, lon, city_name):
     hours = data["hourly"].get("time", [])
     precip = data["hourly"].get("precipitation", [])
 
-    df = pd.DataFrame({"time": hours, "precip": precip})
-    # parse times robustly
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
-    try:
-        if df["time"].dt.tz is None:
-            df["time"] = df["time"].dt.tz_localize("America/Sao_Paulo")
-        else:
-            df["time"] = df["time"].dt.tz_convert("America/Sao_Paulo")
-    except Exception:
-        df["time"] = pd.to_datetime(df["time"], errors="coerce")
-        df["time"] = df["time"].dt.tz_localize("America/Sao_Paulo", ambiguous="NaT", nonexistent="shift_forward")
-    df = df.sort_values("time").reset_index(drop=True)
-    return df, data
+    # Open-Meteo returns naive America/Sao_Paulo wall times, ascending. Brazil
+    # has no DST since 2019, so keep them naive and skip the per-element
+    # tz_localize; the order is already what the searchsorted split needs.
+    # A null or malformed timestamp becomes NaT and its row is dropped, so
+    # it cannot break the sort order the split relies on.
+    df = pd.DataFrame({
+        "time": pd.to_datetime(hours, format="%Y-%m-%dT%H:%M", errors="coerce"),
+        "precip": np.asarray(precip, dtype=np.float32),
+    })
+    return df.dropna(subset=["time"]), data
 
 # ------------------------------------------------------------------
-# HOURLY CACHE WRAPPER (1 hour)
+# CACHE STATS (process-wide: lookups counted in the UI, misses in the
+# cached bodies, which only run when st.cache_data has no entry).
+# Prefetch workers and concurrent sessions update it, so every access
+# goes through the lock held alongside it.
 # ------------------------------------------------------------------
-@st.cache_data(ttl=3600)
-def fetch_precip_cached(lat, lon, city):
+@st.cache_resource
+def cache_stats() -> tuple[Counter, threading.Lock]:
+    return Counter(), threading.Lock()
+
+def count_stat(key: str, n: int = 1) -> None:
+    stats, lock = cache_stats()
+    with lock:
+        stats[key] += n
+
+def stats_snapshot() -> Counter:
+    stats, lock = cache_stats()
+    with lock:
+        return stats.copy()
+
+# ------------------------------------------------------------------
+# HOURLY CACHE WRAPPER (keyed by clock hour)
+# ------------------------------------------------------------------
+# In memory, expiring with the hour key (see app_common.hour_bucket);
+# HTTP_CACHE covers restarts. Keyed by city name alone (coordinates come
+# from CITIES), so the key is two short strings rather than floats whose
+# repr Streamlit has to hash.
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def fetch_precip_cached(city, hour_key):
+    count_stat("fetch_precip_cached.misses")
+    lat, lon = CITIES[city]
     return fetch_precip(lat, lon, city)
 
 # ------------------------------------------------------------------
 # FETCH MONTHLY PRECIP (last 12 months)
 # ------------------------------------------------------------------
-def fetch_monthly_precip(lat, lon):
-    today = datetime.utcnow().date()
-    start = today - timedelta(days=365)
-
-    url = (
+# The archive window ends "today" in UTC, so its cache key is the UTC date:
+# it rolls over exactly when the URL does, not up to an hour later.
+def date_bucket() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+def archive_url(lats, lons, end_date):
+    """ERA5 daily totals for the 365 days up to end_date; lats/lons may be comma lists."""
+    end = date.fromisoformat(end_date)
+    start = end - timedelta(days=365)
+    return (
         "https://archive-api.open-meteo.com/v1/era5"
-        f"?latitude={lat}&longitude={lon}"
-        f"&start_date={start}&end_date={today}"
+        f"?latitude={lats}&longitude={lons}"
+        f"&start_date={start}&end_date={end}"
         "&daily=precipitation_sum"
         "&timezone=America%2FSao_Paulo"
     )
 
-    data = safe_request_json(url)
-
-    if isinstance(data, dict) and data.get("error") is True:
-        return pd.DataFrame(columns=["month", "precip"]), data
-
+def monthly_from_daily(data):
+    """Last 12 monthly totals from one location's archive response."""
     if "daily" not in data:
-        return pd.DataFrame(columns=["month", "precip"]), data
+        return pd.DataFrame(columns=["month", "precip"])
 
     dates = data["daily"].get("time", [])
     precip = data["daily"].get("precipitation_sum", [])
 
-    df = pd.DataFrame({"date": pd.to_datetime(dates, errors="coerce"), "precip": precip})
-    df["month"] = df["date"].dt.to_period("M").dt.to_timestamp()
-    df_month = df.groupby("month", as_index=False)["precip"].sum().sort_values("month").tail(12)
-    return df_month, data
+    df = pd.DataFrame({
+        "date": pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce"),
+        "precip": np.asarray(precip, dtype=np.float32),
+    })
+    df = df.dropna(subset=["date"]).sort_values("date")
+    if df.empty:
+        return pd.DataFrame(columns=["month", "precip"])
+
+    # Rows are sorted, so each month is one contiguous run: a single reduceat
+    # sums them, and months with no rows (e.g. around a stray boundary date)
+    # get no bin at all. NaN days count as 0, as with resample().sum().
+    months = df["date"].to_numpy().astype("datetime64[M]")
+    edges = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+    totals = np.add.reduceat(np.nan_to_num(df["precip"].to_numpy()), edges)
+
+    return pd.DataFrame({
+        "month": months[edges][-12:].astype("datetime64[ns]"),
+        "precip": totals[-12:],
+    })
+
+def fetch_monthly_precip(lat, lon, end_date):
+    url = archive_url(lat, lon, end_date)
+    data = HTTP_CACHE.get_or_fetch(url, None, ARCHIVE_TTL, lambda: safe_request_json(url))
+
+    if isinstance(data, dict) and data.get("error") is True:
+        return pd.DataFrame(columns=["month", "precip"]), data
+
+    return monthly_from_daily(data), data
 
 # ------------------------------------------------------------------
-# MONTHLY CACHE WRAPPER (1 hour)
+# MONTHLY BATCH (all cities in one multi-location archive request)
 # ------------------------------------------------------------------
-@st.cache_data(ttl=3600)
-def fetch_monthly_precip_cached(lat, lon):
-    return fetch_monthly_precip(lat, lon)
+# The monthly caches are keyed by date, so anything they return is kept for
+# the rest of the day: failures are raised instead, which st.cache_data does
+# not store. The short-ttl wrappers below hold on to a failure for
+# FAILURE_TTL, so an outage is retried every few minutes, not on every rerun.
+FAILURE_TTL = 300
+
+class MonthlyFetchError(Exception):
+    def __init__(self, raw):
+        super().__init__(raw)
+        self.raw = raw
+
+@st.cache_data(ttl=86400, max_entries=4, show_spinner=False)
+def fetch_monthly_precip_batch(date_key):
+    """
+    Raw archive response per city, from one request for every city.
+    Open-Meteo returns one block per coordinate, in order; an error comes
+    back as a single object and raises MonthlyFetchError.
+    """
+    lats = ",".join(map(str, CITY_LATS.tolist()))
+    lons = ",".join(map(str, CITY_LONS.tolist()))
+    url = archive_url(lats, lons, date_key)
+    data = HTTP_CACHE.get_or_fetch(url, None, ARCHIVE_TTL, lambda: safe_request_json(url))
+    if not isinstance(data, list):
+        raise MonthlyFetchError(data)
+    return {name: block for name, block in zip(CITY_NAMES, data) if "daily" in block}
+
+@st.cache_data(ttl=FAILURE_TTL, max_entries=4, show_spinner=False)
+def monthly_batch_or_error(date_key):
+    """(blocks, None) from the batch, or ({}, raw error) while it is failing."""
+    try:
+        return fetch_monthly_precip_batch(date_key), None
+    except MonthlyFetchError as e:
+        return {}, e.raw
 
 # ------------------------------------------------------------------
-# STREAMLIT UI
+# MONTHLY CACHE WRAPPER (keyed by UTC date; ttl drops past days)
 # ------------------------------------------------------------------
-st.title("🌧️ Brazil Precipitation Dashboard")
-
-city = st.selectbox("Select a city:", list(CITIES.keys()))
-lat, lon = CITIES[city]
-
-# Fetch hourly and monthly data (cached hourly)
-with st.spinner("Fetching hourly data (cached hourly)..."):
-    df_hourly, raw_hourly = fetch_precip_cached(lat, lon, city)
+@st.cache_data(ttl=86400, max_entries=64, show_spinner=False)
+def fetch_monthly_precip_cached(city, date_key):
+    count_stat("fetch_monthly_precip_cached.misses")
+    blocks, _ = monthly_batch_or_error(date_key)
+    block = blocks.get(city)
+
+    if block is not None:
+        df, raw = monthly_from_daily(block), block
+    else:
+        # Batch failed or left this city out: single-location request
+        lat, lon = CITIES[city]
+        df, raw = fetch_monthly_precip(lat, lon, date_key)
 
-with st.spinner("Fetching monthly data (cached hourly)..."):
-    df_monthly, raw_monthly = fetch_monthly_precip_cached(lat, lon)
+    if df.empty:
+        raise MonthlyFetchError(raw)
+    return df, raw
 
-# If hourly data failed
-if df_hourly.empty:
-    st.warning("No hourly data available to plot. See debug section for raw response.")
-else:
-    now = datetime.now(BR_TZ)
+@st.cache_data(ttl=FAILURE_TTL, max_entries=64, show_spinner=False)
+def monthly_failure(city, date_key):
+    """Raw error of this city's monthly fetch, or None when it succeeded."""
     try:
-        df_hourly["is_forecast"] = df_hourly["time"] > now
-    except Exception:
-        df_hourly["is_forecast"] = False
-
-    df_hist = df_hourly[df_hourly["is_forecast"] == False]
-    df_fore = df_hourly[df_hourly["is_forecast"] == True]
-
-    fig = go.Figure()
-    if not df_hist.empty:
-        fig.add_trace(go.Scatter(
-            x=df_hist["time"], y=df_hist["precip"],
-            mode="lines",
-            name="Historical Precipitation",
-            line=dict(width=3)
-        ))
-    if not df_fore.empty:
-        fig.add_trace(go.Scatter(
-            x=df_fore["time"], y=df_fore["precip"],
-            mode="lines",
-            name="Forecast Precipitation",
-            line=dict(width=3, dash="dash")
-        ))
-
-    fig.update_layout(
-        title=f"Hourly Precipitation — {city}",
-        xaxis_title="Date / Time (UTC-3)",
-        yaxis_title="Precipitation (mm)",
-        hovermode="x unified",
-        template="plotly_white",
+        fetch_monthly_precip_cached(city, date_key)
+    except MonthlyFetchError as e:
+        return e.raw
+    return None
+
+def load_monthly(city, date_key):
+    """Monthly (df, raw) for the UI: empty on failure, retried after FAILURE_TTL."""
+    raw = monthly_failure(city, date_key)
+    if raw is None:
+        try:
+            return fetch_monthly_precip_cached(city, date_key)
+        except MonthlyFetchError as e:  # success evicted, then failed again
+            raw = e.raw
+    return pd.DataFrame(columns=["month", "precip"]), raw
+
+# ------------------------------------------------------------------
+# PREFETCH (warm both caches for every city, once per hour)
+# ------------------------------------------------------------------
+# Workers inherit the script run context so st.cache_data works there.
+def cache_worker_pool(max_workers):
+    return ThreadPoolExecutor(
+        max_workers=max_workers,
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx()),
     )
-    st.plotly_chart(fig, use_container_width=True)
-
-# Monthly bar plot
-st.subheader("📊 Total Monthly Precipitation — Last 12 Months")
-if df_monthly.empty:
-    st.info("No monthly precipitation data available for this location.")
-else:
-    fig_month = go.Figure()
-    fig_month.add_trace(go.Bar(x=df_monthly["month"], y=df_monthly["precip"], name="Monthly total"))
-    fig_month.update_layout(xaxis_title="Month", yaxis_title="Precipitation (mm)", hovermode="x unified", template="plotly_white")
-    st.plotly_chart(fig_month, use_container_width=True)
-
-# Current status card (2 mm threshold)
-if not df_hourly.empty:
-    last_obs = df_hourly[df_hourly["is_forecast"] == False]
-    if last_obs.empty:
-        last_row = df_hourly.iloc[-1]
-    else:
-        last_row = last_obs.iloc[-1]
-    latest_precip = float(last_row["precip"]) if pd.notna(last_row["precip"]) else 0.0
-    latest_time = last_row["time"]
-    if latest_time is not None and hasattr(latest_time, "tz_convert"):
-        latest_time_str = latest_time.tz_convert("America/Sao_Paulo").strftime("%d/%m/%Y %H:%M")
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def prefetch_all(hour_key):
+    count_stat("fetch_precip_cached.calls", len(CITIES))
+    # UTC midnight is also a BRT hour boundary, so one prefetch per hour
+    # never straddles a date change
+    date_key = date_bucket()
+    with cache_worker_pool(len(CITIES)) as ex:
+        batch = ex.submit(monthly_batch_or_error, date_key)
+        hourly = {name: ex.submit(fetch_precip_cached, name, hour_key) for name in CITY_NAMES}
+
+    # Failures are logged, not raised: the page still renders, and the
+    # affected city reports its error in its own panel
+    for name, future in hourly.items():
+        error = future.exception()
+        if error is None:
+            raw = future.result()[1]
+            if isinstance(raw, dict) and raw.get("error") is True:
+                error = raw.get("reason")
+        if error is not None:
+            logger.warning("Hourly prefetch failed for %s: %s", name, error)
+
+    # With the batch cached these only slice it. If it failed, each city
+    # would fall back to its own request, serially behind the page spinner:
+    # leave those to the city panel instead.
+    _, batch_error = batch.result()
+    if batch_error is not None:
+        logger.warning("Monthly batch prefetch failed: %s", batch_error)
+        return
+    count_stat("fetch_monthly_precip_cached.calls", len(CITIES))
+    for name in CITY_NAMES:
+        df_monthly, raw = load_monthly(name, date_key)
+        if df_monthly.empty:
+            logger.warning("Monthly prefetch failed for %s: %s", name, raw)
+
+# ------------------------------------------------------------------
+# STREAMLIT UI
+# ------------------------------------------------------------------
+# Fixed chart layout, built once; only the title changes per city
+HOURLY_LAYOUT = dict(
+    xaxis_title="Date / Time (UTC-3)",
+    yaxis_title="Precipitation (mm)",
+    hovermode="x unified",
+    template="plotly_white",
+)
+MONTHLY_LAYOUT = dict(
+    xaxis_title="Month",
+    yaxis_title="Precipitation (mm)",
+    hovermode="x unified",
+    template="plotly_white",
+)
+
+st.title("🌧️ Brazil Precipitation Dashboard")
+
+# Runs once per hour per process; afterwards a city switch is a cache hit
+with st.spinner("Loading data for all cities (cached hourly)..."):
+    prefetch_all(hour_bucket())
+
+# Fragments cannot write to the sidebar, so the stats live out here and
+# reflect the counts as of the last full rerun
+with st.sidebar.expander("Cache stats"):
+    stats = stats_snapshot()
+    for name in ("fetch_precip_cached", "fetch_monthly_precip_cached"):
+        calls = stats[f"{name}.calls"]
+        misses = stats[f"{name}.misses"]
+        hit_rate = (calls - misses) / calls if calls else 0.0
+        st.write(f"`{name}`: {calls} calls, {misses} misses ({hit_rate:.0%} hits)")
+
+# City-dependent panel: a city change reruns only this fragment,
+# not the header/logos, prefetch check and sidebar above it.
+@st.fragment
+def city_panel():
+    city = st.selectbox("Select a city:", CITY_NAMES)
+    hour_key = hour_bucket()
+
+    # Fetch hourly and monthly data concurrently (cached hourly). Both are
+    # network-bound, so on a cold cache the waits overlap instead of adding up.
+    with st.spinner("Fetching hourly and monthly data (cached hourly)..."):
+        with cache_worker_pool(2) as ex:
+            hourly_future = ex.submit(fetch_precip_cached, city, hour_key)
+            monthly_future = ex.submit(load_monthly, city, date_bucket())
+            df_hourly, raw_hourly = hourly_future.result()
+            df_monthly, raw_monthly = monthly_future.result()
+
+    count_stat("fetch_precip_cached.calls")
+    count_stat("fetch_monthly_precip_cached.calls")
+
+    # Hourly times are naive local and sorted, so one binary search splits
+    # history from forecast. Both traces take views of the same two arrays,
+    # so nothing is copied (both are empty when the fetch failed).
+    now = datetime.now(BR_TZ).replace(tzinfo=None)
+    times = df_hourly["time"].to_numpy(dtype="datetime64[ns]")
+    precip = df_hourly["precip"].to_numpy()
+    split = int(np.searchsorted(times, np.datetime64(now), side="right"))
+
+    # If hourly data failed
+    if df_hourly.empty:
+        st.warning("No hourly data available to plot. See debug section for raw response.")
     else:
-        latest_time_str = str(latest_time)
-
-    if latest_precip <= 0:
-        emoji = "☀️"
-        label = "Not raining"
-    elif latest_precip <= 2:
-        emoji = "🌦️"
-        label = "Mild rain"
+        fig = go.Figure()
+        if split > 0:
+            fig.add_trace(go.Scattergl(
+                x=times[:split], y=precip[:split],
+                mode="lines",
+                name="Historical Precipitation",
+                line=dict(width=3)
+            ))
+        if split < len(times):
+            fig.add_trace(go.Scattergl(
+                x=times[split:], y=precip[split:],
+                mode="lines",
+                name="Forecast Precipitation",
+                line=dict(width=3, dash="dash")
+            ))
+
+        fig.update_layout(title=f"Hourly Precipitation — {city}", **HOURLY_LAYOUT)
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Monthly bar plot
+    st.subheader("📊 Total Monthly Precipitation — Last 12 Months")
+    if df_monthly.empty:
+        st.info("No monthly precipitation data available for this location.")
     else:
-        emoji = "⛈️"
-        label = "Heavy rain"
+        fig_month = go.Figure()
+        fig_month.add_trace(go.Bar(x=df_monthly["month"], y=df_monthly["precip"], name="Monthly total"))
+        fig_month.update_layout(**MONTHLY_LAYOUT)
+        st.plotly_chart(fig_month, use_container_width=True)
+
+    # Current status card (2 mm threshold)
+    if not df_hourly.empty:
+        # Last observed hour, or the last row if nothing is past yet
+        i = split - 1 if split else -1
+        precip_val = df_hourly["precip"].to_numpy()[i]
+        latest_precip = float(precip_val) if np.isfinite(precip_val) else 0.0
+        latest_time = df_hourly["time"].iat[i]
+        if pd.notna(latest_time):
+            latest_time_str = latest_time.strftime("%d/%m/%Y %H:%M")
+        else:
+            latest_time_str = str(latest_time)
+
+        if latest_precip <= 0:
+            emoji = "☀️"
+            label = "Not raining"
+        elif latest_precip <= 2:
+            emoji = "🌦️"
+            label = "Mild rain"
+        else:
+            emoji = "⛈️"
+            label = "Heavy rain"
 
-    st.markdown(
-        f"""
-        <div style="padding:12px 16px;border-radius:10px;border:1px solid #e6e6e6;background:#ffffffbb;">
-           <strong>{emoji} Current Rain Status — {city}</strong><br/>
-           <span style="font-size:14px;">{label} · Last hour: <strong>{latest_precip:.2f} mm</strong></span><br/>
-           <small style="color:#666;">Time: {latest_time_str} (BRT)</small>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
+        st.markdown(
+            f"""
+            <div style="padding:12px 16px;border-radius:10px;border:1px solid #e6e6e6;background:#ffffffbb;">
+               <strong>{emoji} Current Rain Status — {city}</strong><br/>
+               <span style="font-size:14px;">{label} · Last hour: <strong>{latest_precip:.2f} mm</strong></span><br/>
+               <small style="color:#666;">Time: {latest_time_str} (BRT)</small>
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
+
+    # Debug panels, only with ?debug=1 in the URL: collapsed expanders still
+    # ship their full payload to the browser on every rerun
+    if st.query_params.get("debug") == "1":
+        with st.expander("🛠 Debug: Raw hourly API response"):
+            st.json(raw_hourly)
+
+        with st.expander("🛠 Debug: Raw monthly API response"):
+            st.json(raw_monthly)
 
-# Debug panels
-with st.expander("🛠 Debug: Raw hourly API response"):
-    st.json(raw_hourly)
+        with st.expander("🛠 Debug: Hourly DataFrame"):
+            st.dataframe(df_hourly)
 
-with st.expander("🛠 Debug: Raw monthly API response"):
-    st.json(raw_monthly)
+        with st.expander("🛠 Debug: Monthly DataFrame"):
+            st.dataframe(df_monthly)
 
-with st.expander("🛠 Debug: Hourly DataFrame"):
-    st.dataframe(df_hourly)
 
-with st.expander("🛠 Debug: Monthly DataFrame"):
-    st.dataframe(df_monthly)
+city_panel()
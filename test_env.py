@@ -1,9 +1,13 @@
 import streamlit as st
 import pandas as pd
-import requests
-from datetime import datetime, timedelta
-import pytz
+import numpy as np
+import orjson
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import plotly.graph_objects as go
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from app_common import BR_TZ, get_session, hour_bucket
 
 # ---------------------------------------------------------
 # BRANDING (background + logos)
@@ -31,95 +35,130 @@ CITIES = {
     "São Paulo": (-23.5505, -46.6333),
     "Vassouras": (-22.4039, -43.6628),
 }
+CITY_NAMES = tuple(CITIES)
 
 # ---------------------------------------------------------
-# TIMEZONE
+# HTTP SESSION (shared keep-alive pool, see app_common)
 # ---------------------------------------------------------
-BR_TZ = pytz.timezone("America/Sao_Paulo")
+SESSION = get_session()
 
 # ---------------------------------------------------------
-# FETCH PRECIPITATION DATA
+# FETCH PRECIPITATION DATA (cached per clock hour)
 # ---------------------------------------------------------
-def fetch_precip(lat, lon):
-    now = datetime.now(BR_TZ)
-    start = now - timedelta(days=7)
-
-    start_str = start.strftime("%Y-%m-%dT%H:00")
-    end_str = (now + timedelta(days=2)).strftime("%Y-%m-%dT%H:00")
-
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def fetch_precip(lat, lon, hour_key):
     url = (
         "https://api.open-meteo.com/v1/forecast"
         f"?latitude={lat}&longitude={lon}"
         "&hourly=precipitation"
-        f"&start_date={start_str[:10]}&end_date={end_str[:10]}"
+        "&past_days=7&forecast_days=2"
         "&timezone=America%2FSao_Paulo"
     )
 
-    r = requests.get(url)
-    data = r.json()
+    r = SESSION.get(url, timeout=15)
+    r.raise_for_status()
+    data = orjson.loads(r.content)
 
     hours = data["hourly"]["time"]
     precip = data["hourly"]["precipitation"]
 
-    df = pd.DataFrame({"time": hours, "precip": precip})
-    df["time"] = pd.to_datetime(df["time"], utc=False).dt.tz_localize("America/Sao_Paulo")
-    df.sort_values("time", inplace=True)
+    # Open-Meteo returns the hours already in order, so no sort is needed
+    times = pd.to_datetime(hours, format="%Y-%m-%dT%H:%M", cache=True).tz_localize("America/Sao_Paulo")
+    df = pd.DataFrame({"time": times, "precip": np.asarray(precip, dtype=np.float32)})
 
     return df
 
+# ---------------------------------------------------------
+# PREFETCH (warm the cache for every city, once per hour)
+# ---------------------------------------------------------
+# Workers inherit the script run context so st.cache_data works there.
+# fetch_precip raises on HTTP errors, so a failed city is not cached and is
+# fetched again when it is selected; the failure is only logged here.
+logger = logging.getLogger(__name__)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def prefetch_all(hour_key):
+    with ThreadPoolExecutor(
+        max_workers=len(CITIES),
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx()),
+    ) as ex:
+        futures = {
+            name: ex.submit(fetch_precip, lat, lon, hour_key)
+            for name, (lat, lon) in CITIES.items()
+        }
+    for name, future in futures.items():
+        if future.exception() is not None:
+            logger.warning("Prefetch failed for %s: %s", name, future.exception())
+
 # ---------------------------------------------------------
 # UI
 # ---------------------------------------------------------
+# Fixed chart layout, built once; only the title changes per city
+HOURLY_LAYOUT = dict(
+    xaxis_title="Date / Time (UTC-3)",
+    yaxis_title="Precipitation (mm)",
+    hovermode="x unified",
+    template="plotly_white",
+)
+
 st.title("🌧️ Brazil Precipitation Dashboard (7-Day Rolling + Forecast)")
 
-city = st.selectbox("Select a city:", list(CITIES.keys()))
+city = st.selectbox("Select a city:", CITY_NAMES)
 lat, lon = CITIES[city]
 
+# One clock reading per rerun: the cache key and the split agree on "now"
+now = datetime.now(BR_TZ)
+
+# Runs once per hour per process; afterwards a city switch is a cache hit
 with st.spinner("Fetching data..."):
-    df = fetch_precip(lat, lon)
+    prefetch_all(hour_bucket(now))
+    df = fetch_precip(lat, lon, hour_bucket(now))
 
 # ---------------------------------------------------------
 # HISTORICAL VS FORECAST SPLIT
 # ---------------------------------------------------------
-now = datetime.now(BR_TZ)
-df["is_forecast"] = df["time"] > now
+# Rows are in time order, so one binary search splits history (<= now)
+# from forecast; iloc slices avoid copying the cached frame.
+split = int(df["time"].searchsorted(pd.Timestamp(now), side="right"))
 
-df_hist = df[df["is_forecast"] == False]
-df_fore = df[df["is_forecast"] == True]
+df_hist = df.iloc[:split]
+df_fore = df.iloc[split:]
 
 # ---------------------------------------------------------
 # PLOT
 # ---------------------------------------------------------
+# Plain ndarrays skip plotly's Series conversion. Wall times are passed
+# naive: .to_numpy() on a tz-aware column would yield boxed Timestamps.
+hist_time = df_hist["time"].dt.tz_localize(None).to_numpy()
+fore_time = df_fore["time"].dt.tz_localize(None).to_numpy()
+
 fig = go.Figure()
 
-fig.add_trace(go.Scatter(
-    x=df_hist["time"],
-    y=df_hist["precip"],
+fig.add_trace(go.Scattergl(
+    x=hist_time,
+    y=df_hist["precip"].to_numpy(),
     mode="lines",
     name="Historical Precipitation",
     line=dict(width=3)
 ))
 
-fig.add_trace(go.Scatter(
-    x=df_fore["time"],
-    y=df_fore["precip"],
+fig.add_trace(go.Scattergl(
+    x=fore_time,
+    y=df_fore["precip"].to_numpy(),
     mode="lines",
     name="Forecast Precipitation",
     line=dict(width=3, dash="dash")
 ))
 
-fig.update_layout(
-    title=f"Hourly Precipitation — {city}",
-    xaxis_title="Date / Time (UTC-3)",
-    yaxis_title="Precipitation (mm)",
-    hovermode="x unified",
-    template="plotly_white",
-)
+fig.update_layout(title=f"Hourly Precipitation — {city}", **HOURLY_LAYOUT)
 
 st.plotly_chart(fig, use_container_width=True)
 
 # ---------------------------------------------------------
 # DEBUG TABLE
 # ---------------------------------------------------------
-with st.expander("🛠 Debug: Raw hourly data returned by Open-Meteo"):
-    st.dataframe(df, use_container_width=True)
+# Only with ?debug=1: collapsed expanders still ship their payload
+if st.query_params.get("debug") == "1":
+    with st.expander("🛠 Debug: Raw hourly data returned by Open-Meteo"):
+        st.dataframe(df, use_container_width=True)